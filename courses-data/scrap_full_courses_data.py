@@ -1,18 +1,24 @@
 from bs4 import BeautifulSoup
-import requests
+import aiohttp
+import asyncio
+import orjson
 import pandas as pd
-import json
 import os
+import random
 import re
-from time import sleep
 
 # ---------------- CONFIG ----------------
 CSV_FILE = "../mftplus_courses.csv"
 OUTPUT_JSON = "courses_full_data.json"
 OUTPUT_FOLDER = "course_fields"
+CACHE_FOLDER = os.path.join("cache", "scrape")
 LINK_COLUMN = "course_url"
 LESSON_ID_REGEX = r"/lesson/(\d+)/"
 
+MAX_CONCURRENCY = 8
+REQUEST_TIMEOUT = 20
+REQUEST_JITTER = (0.1, 0.3)
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
@@ -25,6 +31,14 @@ FIELDS = [
     "career_opportunities"
 ]
 
+# h2 heading keyword -> field name, checked in order
+SECTION_HEADINGS = {
+    "پیش نیاز": "prerequisites",
+    "سرفصل": "curriculum",
+    "کسب توانایی": "skills_acquired",
+    "بازار کار": "career_opportunities"
+}
+
 # ---------------- EXTRACT LESSON ID ----------------
 def extract_lesson_id(url):
     match = re.search(LESSON_ID_REGEX, url)
@@ -36,32 +50,28 @@ def extract_unique_urls_by_lessonid(csv_file):
         print(f"❌ File not found: {csv_file}")
         return []
 
-    df = pd.read_csv(csv_file)
+    # only the link column is needed; a missing column still falls through to the check below
+    df = pd.read_csv(csv_file, usecols=lambda c: c == LINK_COLUMN, dtype={LINK_COLUMN: "string"}, engine="c")
 
     if LINK_COLUMN not in df.columns:
         print(f"❌ Column '{LINK_COLUMN}' not found in CSV")
         return []
 
-    unique_ids = set()
-    urls = []
-
-    for link in df[LINK_COLUMN].dropna():
-        link = link.strip()
-        lesson_id = extract_lesson_id(link)
-        if not lesson_id:
-            continue
-        if lesson_id in unique_ids:
-            continue
+    links = df[LINK_COLUMN].dropna().astype(str).str.strip()
+    lesson_ids = links.str.extract(LESSON_ID_REGEX, expand=False)
+    # keep the first link seen for each lesson id
+    mask = lesson_ids.notna() & ~lesson_ids.duplicated()
 
-        unique_ids.add(lesson_id)
-        urls.append(link)
-
-    return urls
+    return links[mask].tolist()
 
 # ---------------- SCRAPE COURSE PAGE ----------------
-def scrape_course(url):
-    response = requests.get(url, headers=HEADERS, timeout=20)
-    soup = BeautifulSoup(response.text, "html.parser")
+async def scrape_course(session, url):
+    async with session.get(url) as response:
+        # error pages must not end up in the page cache
+        response.raise_for_status()
+        html = await response.read()
+    # raw bytes let lxml sniff the encoding itself
+    soup = BeautifulSoup(html, "lxml")
 
     lesson_id = extract_lesson_id(url)
 
@@ -71,36 +81,29 @@ def scrape_course(url):
     desc_tag = soup.select_one("div.forced-ellipsis p")
     description = desc_tag.get_text(" ", strip=True) if desc_tag else ""
 
-    prerequisites = []
-    curriculum = []
-    skills_acquired = []
-    career_opportunities = []
+    sections = {field: [] for field in SECTION_HEADINGS.values()}
+    found = set()
 
     for h2 in soup.find_all("h2"):
         text = h2.get_text(strip=True)
+        field = next((f for k, f in SECTION_HEADINGS.items() if k in text), None)
+        if not field or field in found:
+            continue
         ul = h2.find_next("ul", class_="custom-ul")
         if not ul:
             continue
 
-        items = [li.get_text(" ", strip=True) for li in ul.find_all("li")]
-
-        if "پیش نیاز" in text:
-            prerequisites = items
-        elif "سرفصل" in text:
-            curriculum = items
-        elif "کسب توانایی" in text:
-            skills_acquired = items
-        elif "بازار کار" in text:
-            career_opportunities = items
+        sections[field] = [li.get_text(" ", strip=True) for li in ul.find_all("li")]
+        found.add(field)
+        # the remaining h2s are navigation/sidebar headings
+        if len(found) == len(sections):
+            break
 
     return {
         "lesson_id": lesson_id,
         "title": title,
         "description": description,
-        "prerequisites": prerequisites,
-        "curriculum": curriculum,
-        "skills_acquired": skills_acquired,
-        "career_opportunities": career_opportunities,
+        **sections,
         "url": url
     }
 
@@ -171,28 +174,73 @@ def save_fields_separately(data, output_folder=OUTPUT_FOLDER):
 
     print(f"✅ Saved each field into folders under '{output_folder}'")
 
+# ---------------- PAGE CACHE ----------------
+def cache_path(url):
+    return os.path.join(CACHE_FOLDER, f"{extract_lesson_id(url)}.json")
+
+def load_cached(url):
+    path = cache_path(url)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+def save_cached(data):
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = cache_path(data["url"])
+    # write to a temp file first so an interrupted run never leaves a half-written entry
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data))
+    os.replace(tmp_path, path)
+
+# ---------------- SCRAPE ALL ----------------
+async def scrape_all(urls):
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    done = 0
+
+    async def bounded(session, url):
+        nonlocal done
+        async with sem:
+            try:
+                data = await scrape_course(session, url)
+            except Exception as e:
+                print(f"❌ Error scraping {url}:", e)
+                return None
+            finally:
+                done += 1
+            save_cached(data)
+            print(f"📘 [{done}/{len(urls)}] Scraped: {url}")
+            # small per-task jitter to stay polite to the server
+            await asyncio.sleep(random.uniform(*REQUEST_JITTER))
+            return data
+
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(*[bounded(session, url) for url in urls])
+
+    return [r for r in results if r is not None]
+
 # ---------------- MAIN ----------------
 def main():
     urls = extract_unique_urls_by_lessonid(CSV_FILE)
     print(f"🔗 {len(urls)} unique URLs found")
 
-    results = []
+    cached = {url: load_cached(url) for url in urls}
+    pending = [url for url, data in cached.items() if data is None]
+    print(f"💾 {len(urls) - len(pending)} cached, {len(pending)} to scrape")
 
-    for i, url in enumerate(urls, 1):
-        print(f"📘 [{i}/{len(urls)}] Scraping: {url}")
-        try:
-            data = scrape_course(url)
-            results.append(data)
-            sleep(1)
-        except Exception as e:
-            print(f"❌ Error scraping {url}:", e)
+    scraped = {data["url"]: data for data in asyncio.run(scrape_all(pending))}
+    results = [cached[url] or scraped.get(url) for url in urls]
+    results = [data for data in results if data]
 
     # clean data
     cleaned = [clean_object(item) for item in results]
 
     # save full cleaned JSON
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(cleaned, f, ensure_ascii=False, indent=2)
+    with open(OUTPUT_JSON, "wb") as f:
+        f.write(orjson.dumps(cleaned, option=orjson.OPT_INDENT_2))
 
     print(f"\n✅ Saved {len(cleaned)} courses to {OUTPUT_JSON}")
 
@@ -1,12 +1,14 @@
 import aiohttp
 import asyncio
+import orjson
 import pandas as pd
-import json
 import os
 import argparse
+import sys
 from urllib.parse import quote
 import jdatetime
 import re
+from functools import lru_cache
 from pandas.errors import EmptyDataError
 
 # ---------------- CONFIG ----------------
@@ -16,9 +18,12 @@ PAGE_SIZE = 9
 MAX_CONCURRENCY = 5
 MAX_EMPTY_PAGES = 2
 
+PARQUET_FILE = "mftplus_courses.parquet"
 CSV_FILE = "mftplus_courses.csv"
 JSON_FILE = "mftplus_courses.json"
 LOG_FILE = "COURSE_LOG.md"
+WRITE_BUFFER = 1 << 20
+FILTER_DATA_DIR = "filterparam-data"
 
 COLUMNS = [
     "id", "class_id", "lesson_id",
@@ -28,6 +33,11 @@ COLUMNS = [
     "course_url", "cover", "certificate",
     "is_active", "changed_at", "updated_at"
 ]
+INT_COLUMNS = ["class_id", "lesson_id", "capacity", "duration_hours", "min_price", "max_price"]
+COLUMN_DTYPES = {
+    col: "Int64" if col in INT_COLUMNS else "boolean" if col == "is_active" else "string"
+    for col in COLUMNS
+}
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0",
@@ -43,13 +53,22 @@ MONTHS_FA = {
     "مهر": 7, "آبان": 8, "آذر": 9,
     "دی": 10, "بهمن": 11, "اسفند": 12
 }
+JALALI_DATE_RE = re.compile(r"(\d{1,2}) (\w+) (\d{4})")
 
 # ---------------- HELPERS ----------------
 def fa_to_en_func(val):
+    # API fields are almost always strings; skip the pd.isna check for them
+    if isinstance(val, str):
+        return val.translate(FA_TO_EN)
     if pd.isna(val):
         return None
     return str(val).translate(FA_TO_EN)
 
+def normalize_int(val):
+    if val in [None, ""]:
+        return None
+    return int(fa_to_en_func(val))
+
 def normalize_price(val):
     if not val or pd.isna(val):
         return None
@@ -62,23 +81,38 @@ def normalize_bool(val):
     except:
         return False
 
+def normalize_bool_series(s):
+    # vectorized normalize_bool: anything that is not a number counts as False
+    return pd.to_numeric(s, errors="coerce").astype("Float64").fillna(0).astype(int).astype(bool)
+
+def json_default(obj):
+    # orjson has no native handling for pandas' missing-value sentinel
+    if obj is pd.NA:
+        return None
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
 def now_jalali():
     j = jdatetime.datetime.now()
     return f"{j.year:04d}-{j.month:02d}-{j.day:02d}"
 
+@lru_cache(maxsize=4096)
+def jalali_iso(year, month, day):
+    # many courses share a start/end date, so build each jdatetime.date once
+    jd = jdatetime.date(year, month, day)
+    return f"{jd.year:04d}-{jd.month:02d}-{jd.day:02d}"
+
 def normalize_jalali_date(text):
     if not text or pd.isna(text):
         return None
     text = fa_to_en_func(text)
-    match = re.search(r"(\d{1,2}) (\w+) (\d{4})", text)
+    match = JALALI_DATE_RE.search(text)
     if not match:
         return None
     day, month_fa, year = match.groups()
     month = MONTHS_FA.get(month_fa)
     if not month:
         return None
-    jd = jdatetime.date(int(year), month, int(day))
-    return f"{jd.year:04d}-{jd.month:02d}-{jd.day:02d}"
+    return jalali_iso(int(year), month, int(day))
 
 def get_season_from_jalali(date_str):
     if not date_str:
@@ -100,8 +134,7 @@ def get_season_from_jalali(date_str):
 def make_course_link(course):
     return f"https://mftplus.com/lesson/{course.get('lessonId','')}/{course.get('lessonUrl','')}?refp={quote(course.get('center',''))}"
 
-def normalize_course(course, is_active, changed_at):
-    now = now_jalali()
+def normalize_course(course, is_active, changed_at, now):
     start_date = normalize_jalali_date(course.get("start"))
     return {
         "id": course["id"]["$oid"],
@@ -114,8 +147,8 @@ def normalize_course(course, is_active, changed_at):
         "start_date": start_date,
         "end_date": normalize_jalali_date(course.get("end")),
         "season": get_season_from_jalali(start_date),
-        "capacity": int(fa_to_en_func(course.get("capacity"))) if course.get("capacity") not in [None,""] else None,
-        "duration_hours": int(fa_to_en_func(course.get("time"))) if course.get("time") not in [None,""] else None,
+        "capacity": normalize_int(course.get("capacity")),
+        "duration_hours": normalize_int(course.get("time")),
         "days": " | ".join(course.get("days",[])),
         "min_price": normalize_price(course.get("minCost")),
         "max_price": normalize_price(course.get("maxCost")),
@@ -127,74 +160,103 @@ def normalize_course(course, is_active, changed_at):
         "updated_at": now
     }
 
+def coerce_types(df):
+    # parquet needs one type per column; API rows and stored rows can disagree
+    df = df.copy()
+    for col in COLUMNS:
+        if col in INT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        elif col == "is_active":
+            df[col] = normalize_bool_series(df[col])
+        else:
+            df[col] = df[col].astype("string")
+    return df
+
 # ---------------- LOAD EXISTING ----------------
 def load_existing():
+    if os.path.exists(PARQUET_FILE):
+        return pd.read_parquet(PARQUET_FILE, columns=COLUMNS)
+    # first run (or CSV-only checkout): seed from the exported CSV
     if not os.path.exists(CSV_FILE):
         return pd.DataFrame(columns=COLUMNS)
     try:
-        df = pd.read_csv(CSV_FILE)
+        df = pd.read_csv(CSV_FILE, usecols=lambda c: c in COLUMN_DTYPES, dtype=COLUMN_DTYPES, engine="c")
         return df if not df.empty else pd.DataFrame(columns=COLUMNS)
     except EmptyDataError:
         return pd.DataFrame(columns=COLUMNS)
 
 # ---------------- SAVE ----------------
-def save_all(df, new, expired, revived):
+def save_all(df, new, expired, revived, export=True):
     for col in COLUMNS:
         if col not in df.columns:
             df[col] = None
-    df['is_active'] = df['is_active'].apply(lambda x: normalize_bool(x))
-    df.to_csv(CSV_FILE, index=False, encoding="utf-8-sig")
-    df.to_json(JSON_FILE, force_ascii=False, indent=2)
+    df['is_active'] = normalize_bool_series(df['is_active'])
+    coerce_types(df).to_parquet(PARQUET_FILE, compression="zstd", index=False)
+    if export:
+        with open(CSV_FILE, "w", encoding="utf-8-sig", newline="", buffering=WRITE_BUFFER) as f:
+            df.to_csv(f, index=False)
+        with open(JSON_FILE, "wb") as f:
+            f.write(orjson.dumps(df.to_dict(), default=json_default,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
     now = now_jalali()
+    # build the whole entry in memory and append it with a single write
+    parts = [f"\n<details><summary>📊 Sync {now} 📈({len(new)}) 📉({len(expired)}) ♻️({len(revived)})</summary>\n\n"]
+    for title, items in [("📈 New", new),("📉 Expired", expired),("♻️ Revived", revived)]:
+        if items:
+            parts.append(f"<details><summary>{title} ({len(items)})</summary>\n\n")
+            parts.extend([f"- [{c['title']}]({c['course_url']}) | {c['class_id']} | {c['id']} \n" for c in items])
+            parts.append("</details>\n")
+    parts.append("</details>\n")
     with open(LOG_FILE,"a",encoding="utf-8") as f:
-        f.write(f"\n<details><summary>📊 Sync {now} 📈({len(new)}) 📉({len(expired)}) ♻️({len(revived)})</summary>\n\n")
-        for title, items in [("📈 New", new),("📉 Expired", expired),("♻️ Revived", revived)]:
-            if items:
-                f.write(f"<details><summary>{title} ({len(items)})</summary>\n\n")
-                for c in items: f.write(f"- [{c['title']}]({c['course_url']}) | {c['class_id']} | {c['id']} \n")
-                f.write("</details>\n")
-        f.write("</details>\n")
+        f.write("".join(parts))
 
 
 # ---------------- FETCH ----------------
-async def fetch_page(session, payload):
-    async with session.post(API_URL, data=payload) as r:
-        return json.loads(await r.text())
+def make_session():
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, keepalive_timeout=30, ttl_dns_cache=300)
+    return aiohttp.ClientSession(headers=HEADERS, connector=connector)
 
-async def fetch_all(payload):
-    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+async def fetch_page(session, sem, payload, skip):
+    async with sem:
+        async with session.post(API_URL, data={**payload, "skip": skip}) as r:
+            # the API does not always send a JSON content type, so skip the check
+            return await r.json(loads=orjson.loads, content_type=None)
+
+async def fetch_all(session, payload):
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
     skip, empty, data_all = 0, 0, []
-    async with aiohttp.ClientSession(headers=HEADERS, connector=connector) as session:
-        while True:
-            payload["skip"] = skip
-            data = await fetch_page(session, payload)
+    while empty < MAX_EMPTY_PAGES:
+        # fetch a window of MAX_CONCURRENCY pages at once, then consume them in order
+        skips = [skip + i * PAGE_SIZE for i in range(MAX_CONCURRENCY)]
+        pages = await asyncio.gather(*[fetch_page(session, sem, payload, s) for s in skips])
+        for s, data in zip(skips, pages):
             if not data:
                 empty += 1
                 if empty >= MAX_EMPTY_PAGES: break
             else:
                 empty = 0
                 data_all.extend(data)
-                print(f"✅ skip={skip} → {len(data)}")
-            skip += PAGE_SIZE
-            await asyncio.sleep(0.2)
+                print(f"✅ skip={s} → {len(data)}")
+        skip += MAX_CONCURRENCY * PAGE_SIZE
     return data_all
 
 # ---------------- SYNC ----------------
-async def sync(payload):
+async def sync(session, payload, export=True):
     existing_df = load_existing()
     now = now_jalali()
-    existing_map = {str(r["id"]): r.to_dict() for _, r in existing_df.iterrows()}
-    old_active = {k for k,v in existing_map.items() if normalize_bool(v["is_active"])}
-    old_inactive = {k for k,v in existing_map.items() if not normalize_bool(v["is_active"])}
+    ids = existing_df["id"].astype(str)
+    existing_map = existing_df.set_index(ids).to_dict("index")
+    old_active = set(ids[normalize_bool_series(existing_df["is_active"])])
+    old_inactive = set(ids) - old_active
 
-    raw = await fetch_all(payload)
+    raw = await fetch_all(session, payload)
     api_ids, api_courses = set(), []
     for c in raw:
         cid = c["id"]["$oid"]
         api_ids.add(cid)
         prev = existing_map.get(cid)
         changed = not prev or not normalize_bool(prev["is_active"])
-        api_courses.append(normalize_course(c,1,now if changed else prev.get("changed_at", now)))
+        api_courses.append(normalize_course(c,1,now if changed else prev.get("changed_at", now),now))
 
     new = [c for c in api_courses if c["id"] not in existing_map]
     revived = [c for c in api_courses if c["id"] in old_inactive]
@@ -206,23 +268,24 @@ async def sync(payload):
         row["updated_at"] = now
         expired.append(row)
 
-    final = {r["id"]:r for r in existing_map.values()}
-    for c in api_courses + expired: final[c["id"]] = c
-    save_all(pd.DataFrame(final.values(),columns=COLUMNS),new,expired,revived)
+    # existing_map is already keyed by id and expired rows were updated in place
+    final = existing_map
+    final.update((c["id"], c) for c in api_courses)
+    save_all(pd.DataFrame(final.values(),columns=COLUMNS),new,expired,revived,export)
     print(f"✨ New: {len(new)}, ⏸️ Expired: {len(expired)}, ♻️ Revived: {len(revived)}")
 
 # ---------------- FILTER DATA ----------------
+@lru_cache(maxsize=None)
+def load_lookup(name):
+    with open(os.path.join(FILTER_DATA_DIR, f"{name}.json"), "rb") as f:
+        return orjson.loads(f.read())
+
 def load_filter_data():
-    with open("filterparam-data/places.json", encoding="utf-8") as f: places = json.load(f)
-    with open("filterparam-data/departments.json", encoding="utf-8") as f: departments = json.load(f)
-    with open("filterparam-data/groups.json", encoding="utf-8") as f: groups = json.load(f)
-    with open("filterparam-data/courses.json", encoding="utf-8") as f: courses = json.load(f)
-    with open("filterparam-data/months.json", encoding="utf-8") as f: months = json.load(f)
-    return places, departments, groups, courses, months
+    return tuple(load_lookup(name) for name in ("places", "departments", "groups", "courses", "months"))
 
 def multi_select(options, label="title"):
     if not options: return []
-    for i,o in enumerate(options): print(f"{i+1}. {o.get(label,'N/A')}")
+    sys.stdout.write("".join([f"{i+1}. {o.get(label,'N/A')}\n" for i,o in enumerate(options)]))
     raw = input("Enter numbers (comma) or empty: ").strip()
     if not raw: return []
     idxs = [int(x.strip())-1 for x in raw.split(",") if x.strip().isdigit() and 0 <= int(x.strip())-1 < len(options)]
@@ -232,7 +295,7 @@ def get_ids(items):
     return [i["id"]["$oid"] if isinstance(i.get("id"), dict) else i.get("id") for i in items]
 
 # ---------------- MENU ----------------
-async def interactive_menu():
+async def interactive_menu(session, export=True):
     print("""
 1️- Sync all courses (auto)
 2️- Sync with filters (interactive)
@@ -241,7 +304,7 @@ async def interactive_menu():
     choice = input("Select: ").strip()
     if choice=="1":
         payload = {"term": "", "sort": "", "skip":0, "pSkip":0, "type":"all"}
-        await sync(payload)
+        await sync(session, payload, export)
     elif choice=="2":
         places,deps,groups,courses,months = load_filter_data()
         print("\nSelect Places:"); place_ids=get_ids(multi_select(places))
@@ -263,7 +326,7 @@ async def interactive_menu():
             "pSkip": 0,
             "type": "all"
         }
-        await sync(payload)
+        await sync(session, payload, export)
     else:
         print("👋 Bye")
 
@@ -272,15 +335,18 @@ async def main():
     parser = argparse.ArgumentParser(description="MFTPlus course sync")
     parser.add_argument("--all", action="store_true", help="Sync all courses automatically")
     parser.add_argument("--filter", action="store_true", help="Sync with interactive filters")
+    parser.add_argument("--no-export", action="store_true", help="Only update the Parquet store, skip CSV/JSON export")
     args = parser.parse_args()
+    export = not args.no_export
 
-    if args.all:
-        payload = {"term": "", "sort": "", "skip":0, "pSkip":0, "type":"all"}
-        await sync(payload)
-    elif args.filter:
-        await interactive_menu()
-    else:
-        await interactive_menu()
+    async with make_session() as session:
+        if args.all:
+            payload = {"term": "", "sort": "", "skip":0, "pSkip":0, "type":"all"}
+            await sync(session, payload, export)
+        elif args.filter:
+            await interactive_menu(session, export)
+        else:
+            await interactive_menu(session, export)
 
 if __name__=="__main__":
     asyncio.run(main())
\ No newline at end of file